@@ -1 +1,5 @@
-from .main import great_global_controls, great_get_options, great_analysis
+from .main import great_global_controls, great_get_options, great_analysis, great_browser_benchmark
+from .results import great_store_results, great_query_results
+from .plotting import great_render_table, great_render_tables
+from .liftover import great_liftover
+from .background import GreatBackground, great_prepare_background
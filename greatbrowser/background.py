@@ -0,0 +1,87 @@
+import time
+import pandas as pd
+pd.options.mode.chained_assignment = None
+
+import polars as pl
+import numpy as np
+
+from .functions import format_for_great
+from .liftover import great_liftover
+
+class GreatBackground:
+    '''
+    a background region set which has been formatted, validated and serialized for GREAT.\
+    contains only plain python values, so it can be reused across great_analysis calls and sent to worker processes cheaply
+
+        param bed_string: the background regions as tab separated bed text, as entered into GREAT
+        param n_regions: the number of background regions
+        param prepare_seconds: the time taken to load, format, validate and serialize the background
+    '''
+
+    def __init__(self, bed_string, n_regions, prepare_seconds):
+        self.bed_string = bed_string
+        self.n_regions = n_regions
+        self.prepare_seconds = prepare_seconds
+
+    def __repr__(self):
+        return (f'GreatBackground({self.n_regions} regions, {len(self.bed_string)/1e6:.1f} MB, '
+                f'prepared in {self.prepare_seconds:.2f} s, which is saved by each reuse)')
+
+def great_prepare_background(background_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray | str, is_formatted=False, chain_file=None,
+                             df_chr='chr', df_start='start', df_end='end', df_index=None, df_score='score', df_strand='strand',
+                             df_thickStart='thickStart', df_thickEnd='thickEnd', df_rgb='rgb'):
+    '''
+    prepares a background region set once, so that it can be passed as background_regions to any number of great_analysis calls
+
+        param background_regions: the background data to be assessed. Must be a superset including the test sets it is used with
+        param is_formatted: whether the inputted background regions are already in bed format (chr, start, end, name).\
+            if so, the df_ column names are ignored and the first three columns are used as chr, start and end
+        param chain_file: path to a UCSC chain file used to lift the background over before use. see great_liftover() for more information
+        param df_chr: the name of the column in background_regions representing chromosome
+        param df_start: the name of the column in background_regions representing start point
+        param df_end: the name of the column in background_regions representing end point
+        param df_index: the name of the column in background_regions representing name, or index
+        param df_score: the name of the column in background_regions representing score
+        param df_strand: the name of the column in background_regions representing strand
+        param df_thickStart: the name of the column in background_regions representing thickStart
+        param df_thickEnd: the name of the column in background_regions representing thickEnd
+        param df_rgb: the name of the column in background_regions representing rgb
+
+        return: GreatBackground
+    '''
+
+    start_time = time.perf_counter()
+
+    # format genetic data if not already in bed format by column
+    if not is_formatted:
+        background_regions = format_for_great(background_regions, None, df_chr, df_start, df_end, df_index, df_score, df_strand, df_thickStart, df_thickEnd, df_rgb)
+    elif isinstance(background_regions, str): #load formatted file
+        try: background_regions = pd.read_excel(background_regions)
+        except: background_regions = pd.read_csv(background_regions, sep='\t')
+
+    # formatted regions are in bed column order, whatever their column names
+    if is_formatted:
+        if background_regions.shape[1] < 3:
+            raise Exception('Error: Formatted background regions must have at least 3 columns (chr, start, end)')
+        df_chr, df_start, df_end = background_regions.columns[:3]
+
+    if chain_file != None:
+        background_regions, unmapped = great_liftover(background_regions, chain_file, df_chr, df_start, df_end, df_strand)
+        if unmapped.shape[0] > 0:
+            print(f'{unmapped.shape[0]} background regions could not be lifted over and were removed')
+
+    # validate
+    if background_regions.shape[0] == 0:
+        raise Exception('Error: Background regions are empty')
+    for col in [df_chr, df_start, df_end]:
+        if col not in background_regions: raise Exception(f'KeyError: "{col}" not found in background columns')
+    starts = pd.to_numeric(background_regions[df_start], errors='coerce')
+    ends = pd.to_numeric(background_regions[df_end], errors='coerce')
+    if starts.isna().any() or ends.isna().any():
+        raise Exception('Error: Background start and end points must be integers')
+    if (starts < 0).any() or (ends < starts).any():
+        raise Exception('Error: Background regions must have 0 <= start <= end')
+
+    bed_string = background_regions.to_csv(index=False, header=None, sep='\t')
+
+    return GreatBackground(bed_string, background_regions.shape[0], time.perf_counter() - start_time)
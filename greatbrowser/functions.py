@@ -21,10 +21,113 @@ import polars as pl
 import numpy as np
 from PIL import Image
 import io
+from urllib.parse import urlparse
 
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# columns of the tables produced by get_table
+table_columns = ['term_name','go_annotation','binom_rank','binom_raw_pval','binom_bonferroni_pval',
+               'binom_fdr_qval','binom_fold_enrichment','binom_expected','binom_obs_region_hits',
+               'binom_genome_fraction','binom_region_set_coverage', 'hyper_rank','hyper_raw_pval','hyper_bonferroni_pval',
+                'hyper_fdr_qval','hyper_fold_enrichment','hyper_expected','hyper_obs_gene_hits', 
+                'hyper_total_genes','hyper_gene_set_coverage', 'hyper_term_gene_coverage']
+
+# resources which are never needed, blocked in the first tab in lean mode
+lean_blocked_urls = ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot', '*.css',
+                     '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*fonts.googleapis.com*', '*fonts.gstatic.com*',
+                     '*.png', '*.gif', '*.jpg', '*.jpeg', '*.svg', '*.ico'] # images are only ever downloaded by their url
+
+# the only images which are loaded in lean mode, as the plot pages opened by plot_table are rendered by GREAT
+great_image_pattern = '[*.]great.stanford.edu,*'
+
+def get_driver_options(headless, lean, keep_great_images=False):
+    '''
+    establishes the browser settings used for GREAT
+
+        param headless: determines whether the browser is shown during operation or not
+        param lean: whether to skip page resources which are not needed for form entry or table extraction,\
+            and to continue as soon as the page structure has loaded rather than waiting for every resource.\
+            these settings apply to every tab
+        param keep_great_images: whether images served by GREAT should still be loaded in lean mode. all other images are blocked
+
+        return: chrome options
+    '''
+
+    options = Options()
+    options.add_argument('--ignore-ssl-errors=yes') # ignore insecure warning
+    options.add_argument('--ignore-certificate-errors')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_argument("--disable-extensions")
+
+    if headless:
+        options.add_argument('--headless') # makes it so that the browser doesn't open
+
+    if lean:
+        options.page_load_strategy = 'eager' # don't wait for images, stylesheets and subframes
+        prefs = {'profile.managed_default_content_settings.plugins': 2,
+                 'profile.managed_default_content_settings.notifications': 2,
+                 'profile.default_content_setting_values.images': 2}
+        if keep_great_images:
+            prefs['profile.content_settings.exceptions.images'] = {great_image_pattern: {'setting': 1}}
+        options.add_experimental_option('prefs', prefs)
+
+    return options
+
+def start_driver(options, lean):
+    '''
+    starts a browser, additionally blocking fonts, stylesheets, trackers and images in the first tab in lean mode.\
+    tabs opened later, such as by plot_table, only use the settings from get_driver_options
+
+        param options: chrome options, as produced by get_driver_options
+        param lean: whether to block resources which are not needed
+
+        return: driver
+    '''
+
+    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()),
+                            options=options)
+
+    if lean:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': lean_blocked_urls})
+
+    return driver
+
+def click_element(driver, element, lean):
+    '''
+    clicks an element of the submission form. in lean mode stylesheets are blocked, so elements may be placed differently,\
+    hidden or overlapped, and are clicked through javascript instead, which does not depend on the layout
+
+        param driver: the driver focused on the webpage of interest
+        param element: the element to click
+        param lean: whether lean mode is active
+
+        return: none
+    '''
+
+    if lean: driver.execute_script("arguments[0].click();", element)
+    else: element.click()
+
+    return
+
+def wait_for_page(driver, timeout=20):
+    '''
+    waits until every script on the page has run. with the eager page load strategy used in lean mode,\
+    selenium continues as soon as the page structure has loaded, before the page's own scripts may be ready
+
+        param driver: the driver focused on the webpage of interest
+        param timeout: the maximum time to wait, in seconds
+
+        return: none
+    '''
+
+    try: WebDriverWait(driver, timeout).until(lambda d: d.execute_script('return document.readyState') == 'complete')
+    except TimeoutException: raise Exception(f'Error: Page did not finish loading within {timeout} seconds. Potential reasons: connection problems. Try lean=False or headless=False to troubleshoot.')
+
+    return
+
 def format_for_great(bed_data: pd.DataFrame | pl.DataFrame | list | np.ndarray | str, get, df_chr, df_start, df_end, df_index,
                      df_score, df_strand, df_thickStart, df_thickEnd, df_rgb):
     '''
@@ -233,6 +336,75 @@ def get_ucsc_browser(driver):
 
     return
 
+def is_ucsc_url(url):
+    '''
+    checks whether a url leads to the ucsc genome browser, rather than to a GREAT page or redirect
+        param url: the url to check
+
+        return: bool
+    '''
+
+    if url == None:
+        return False
+    parsed = urlparse(url)
+    return parsed.netloc.split(':')[0].endswith('.ucsc.edu') and 'hgTracks' in parsed.path
+
+def get_ucsc_url(driver):
+    '''
+    get the ucsc browser url for the region set, without opening a second browser
+        param driver: the driver focused on the webpage of interest
+
+        return: url of the ucsc browser session
+    '''
+
+    # the link may lead directly to ucsc
+    go_to_ucsc_btn = driver.find_element(By.LINK_TEXT, 'Show in UCSC genome browser.')
+    url = go_to_ucsc_btn.get_attribute('href')
+    if is_ucsc_url(url):
+        return url
+
+    # otherwise follow it, and take the url as soon as the tab has been redirected to ucsc
+    driver.execute_script("arguments[0].click();", go_to_ucsc_btn)
+    driver.switch_to.window(driver.window_handles[1])
+    try: temp = WebDriverWait(driver, 10).until(lambda d: is_ucsc_url(d.current_url))
+    except TimeoutException: raise Exception('Error: Loading exceeded 10 seconds. Potential reason: connection problems. Use headless=False to troubleshoot.')
+    url = driver.current_url
+
+    # return to the GREAT tab
+    driver.close()
+    driver.switch_to.window(driver.window_handles[0])
+
+    return url
+
+def format_ucsc_track(bed_data: pd.DataFrame, assembly, track_name, df_chr, df_start, df_end, df_index):
+    '''
+    formats a region set as a ucsc custom track, which can be pasted or uploaded at https://genome.ucsc.edu/cgi-bin/hgCustom
+
+        param bed_data: bed formatted regions, as produced by format_for_great
+        param assembly: the assembly of the regions
+        param track_name: the name of the track shown in the browser
+        param df_chr: the name of the column in bed_data representing chromosome
+        param df_start: the name of the column in bed_data representing start point
+        param df_end: the name of the column in bed_data representing end point
+        param df_index: the name of the column in bed_data representing name, or index
+
+        return: custom track as a string
+    '''
+
+    columns = [df_chr, df_start, df_end]
+    if df_index in bed_data:
+        columns.append(df_index)
+
+    if bed_data.shape[0] == 0:
+        raise Exception('Error: No regions to make a track from. Potential reason: no regions could be lifted over')
+
+    # open the browser on the first region
+    first = bed_data.iloc[0]
+    header = f'browser position {first[df_chr]}:{first[df_start]+1}-{max(first[df_end], first[df_start]+1)}\n'
+    header += f'track name="{track_name}" description="{track_name}" db={assembly} visibility=pack\n'
+
+    return header + bed_data[columns].to_csv(index=False, header=None, sep='\t')
+
 def get_n_genes_region(driver, specifier, file_name, get):
     '''
     download a plot indicating the distance between the regions and their associated genes
@@ -347,22 +519,18 @@ def get_table(driver, specifier, assembly):
         else:
             all_row_info.append(row_info)
 
-    column_names = ['term_name','go_annotation','binom_rank','binom_raw_pval','binom_bonferroni_pval',
-               'binom_fdr_qval','binom_fold_enrichment','binom_expected','binom_obs_region_hits',
-               'binom_genome_fraction','binom_region_set_coverage', 'hyper_rank','hyper_raw_pval','hyper_bonferroni_pval',
-                'hyper_fdr_qval','hyper_fold_enrichment','hyper_expected','hyper_obs_gene_hits', 
-                'hyper_total_genes','hyper_gene_set_coverage', 'hyper_term_gene_coverage']
-    table_df = pd.DataFrame.from_records(all_row_info, columns=column_names)
+    table_df = pd.DataFrame.from_records(all_row_info, columns=table_columns)
         
     return table_df
 
-def adjust_global_controls(driver, to_adjust : dict):
+def adjust_global_controls(driver, to_adjust : dict, lean=False):
     '''
     modifies "global control" parameters
 
         param driver: the driver focused on the webpage of interest
         param to_adjust: dictionary determining which parameters are adjusted. takes id as input and desired value as output.\
             see great_global_controls() for more information
+        param lean: whether lean mode is active, in which case the updated page is waited for before continuing
 
         return: none
     '''
@@ -378,7 +546,7 @@ def adjust_global_controls(driver, to_adjust : dict):
     # change the selected pval view
     if 'view' in to_adjust:
         switch_pval_view = driver.find_element(By.ID, to_adjust['view'])
-        switch_pval_view.click()
+        click_element(driver, switch_pval_view, lean)
         to_adjust.pop('view')
 
     # change all other params
@@ -389,7 +557,8 @@ def adjust_global_controls(driver, to_adjust : dict):
     # update table
     update_btns_criteria = f'//button[contains(@class, "button") and @value="Set"]'
     update_btns = driver.find_elements(By.XPATH, update_btns_criteria)
-    for btn in update_btns: btn.click()
+    for btn in update_btns: click_element(driver, btn, lean)
+    if lean: wait_for_page(driver)
 
     return
 
@@ -0,0 +1,217 @@
+from functools import lru_cache
+from heapq import heappush, heappop
+
+import os
+import gzip
+import pandas as pd
+pd.options.mode.chained_assignment = None
+
+import numpy as np
+
+def resolve_overlaps(starts, ends, priority):
+    '''
+    splits overlapping blocks so that every position is covered by at most one block, the one with the lowest priority value.\
+    blocks which overlap nothing are kept as they are, and only the rest are swept through in order
+
+        param starts: block start points
+        param ends: block end points
+        param priority: block priorities, where lower values are kept
+
+        return: tuple of (piece starts, piece ends, index of the block each piece comes from), sorted by start
+    '''
+
+    order = np.argsort(starts, kind='stable')
+    sorted_starts, sorted_ends = starts[order], ends[order]
+
+    # a block overlaps another if it starts before any earlier block ends, or the next block starts before it ends
+    overlaps = np.zeros(len(order), dtype=bool)
+    overlaps[1:] = sorted_starts[1:] < np.maximum.accumulate(sorted_ends)[:-1]
+    clustered = overlaps.copy()
+    clustered[:-1] |= overlaps[1:]
+
+    # sweep through the boundaries of overlapping blocks, keeping the lowest priority block which is open
+    sweep_starts = sorted_starts[clustered].tolist()
+    sweep_ends = sorted_ends[clustered].tolist()
+    sweep_priority = priority[order][clustered].tolist()
+    sweep_index = order[clustered].tolist()
+    boundaries = np.unique(sorted_starts[clustered].tolist() + sweep_ends).tolist()
+
+    piece_starts, piece_ends, piece_index = [], [], []
+    open_blocks = []
+    j = 0
+    for x, x_next in zip(boundaries[:-1], boundaries[1:]):
+        while j < len(sweep_starts) and sweep_starts[j] <= x:
+            heappush(open_blocks, (sweep_priority[j], sweep_ends[j], sweep_index[j]))
+            j += 1
+        while open_blocks and open_blocks[0][1] <= x:
+            heappop(open_blocks)
+        if not open_blocks:
+            continue
+        block = open_blocks[0][2]
+        if piece_index and piece_index[-1] == block and piece_ends[-1] == x:
+            piece_ends[-1] = x_next # continue the previous piece
+        else:
+            piece_starts.append(x)
+            piece_ends.append(x_next)
+            piece_index.append(block)
+
+    all_starts = np.concatenate([sorted_starts[~clustered], np.array(piece_starts, dtype=np.int64)])
+    all_ends = np.concatenate([sorted_ends[~clustered], np.array(piece_ends, dtype=np.int64)])
+    all_index = np.concatenate([order[~clustered], np.array(piece_index, dtype=np.int64)])
+    piece_order = np.argsort(all_starts, kind='stable')
+
+    return all_starts[piece_order], all_ends[piece_order], all_index[piece_order]
+
+def read_chain(chain_file):
+    '''
+    parses a UCSC chain file into aligned blocks, grouped by source chromosome. where chains overlap on the source assembly,\
+    the higher scoring chain is kept, so that every source position maps to at most one block
+
+        param chain_file: path to the chain file, optionally gzipped. see https://hgdownload.soe.ucsc.edu/downloads.html for available files
+
+        return: dictionary of source chromosome to a dictionary of block arrays, sorted by start
+    '''
+
+    opener = gzip.open if chain_file.endswith('.gz') else open
+
+    # collect the blocks of each source chromosome, alongside the chain they come from
+    chains = []
+    blocks = {}
+    with opener(chain_file, 'rt') as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if fields[0] == 'chain':
+                t, q = int(fields[5]), int(fields[10])
+                chain_id = len(chains)
+                chains.append((float(fields[1]), fields[7], int(fields[8]), fields[9] == '-'))
+                t_starts, t_ends, q_starts, chain_ids = blocks.setdefault(fields[2], ([], [], [], []))
+            else:
+                size = int(fields[0])
+                t_starts.append(t)
+                t_ends.append(t + size)
+                q_starts.append(q)
+                chain_ids.append(chain_id)
+                if len(fields) == 3:
+                    t += size + int(fields[1])
+                    q += size + int(fields[2])
+
+    if not chains:
+        raise Exception(f'Error: No chains found in {chain_file}')
+
+    # chains are ranked by score, highest first
+    score, q_name, q_size, q_reverse = zip(*chains)
+    rank = np.empty(len(chains), dtype=np.int64)
+    rank[np.argsort(-np.array(score), kind='stable')] = np.arange(len(chains))
+    q_name, q_size, q_reverse = np.array(q_name, dtype=object), np.array(q_size, dtype=np.int64), np.array(q_reverse, dtype=bool)
+
+    # keep the highest scoring block at each position
+    chain_index = {}
+    for t_name, (t_starts, t_ends, q_starts, chain_ids) in blocks.items():
+        t_starts, t_ends = np.array(t_starts, dtype=np.int64), np.array(t_ends, dtype=np.int64)
+        q_starts, chain_ids = np.array(q_starts, dtype=np.int64), np.array(chain_ids, dtype=np.int64)
+        piece_starts, piece_ends, block = resolve_overlaps(t_starts, t_ends, rank[chain_ids])
+
+        chain_index[t_name] = {
+            'start': piece_starts,
+            'end': piece_ends,
+            'q_start': q_starts[block] + piece_starts - t_starts[block],
+            'chain_id': chain_ids[block],
+            'q_name': q_name[chain_ids[block]],
+            'q_size': q_size[chain_ids[block]],
+            'q_reverse': q_reverse[chain_ids[block]]}
+
+    return chain_index
+
+@lru_cache(maxsize=8)
+def load_chain(chain_file, modified):
+    '''
+    cached wrapper of read_chain, so that each chain file is only parsed once per session
+
+        param chain_file: absolute path to the chain file
+        param modified: modification time of the chain file, so that changed files are parsed again
+
+        return: see read_chain()
+    '''
+
+    return read_chain(chain_file)
+
+def great_liftover(regions: pd.DataFrame, chain_file, df_chr='chr', df_start='start', df_end='end', df_strand='strand'):
+    '''
+    converts the coordinates of bed formatted regions to another assembly using a UCSC chain file.\
+    a region is mapped if its first and last bases fall within the same chain, and is otherwise returned as unmapped
+
+        param regions: bed formatted regions, as produced by format_for_great
+        param chain_file: path to the UCSC chain file, optionally gzipped, e.g. hg19ToHg38.over.chain.gz
+        param df_chr: the name of the column in regions representing chromosome
+        param df_start: the name of the column in regions representing start point
+        param df_end: the name of the column in regions representing end point
+        param df_strand: the name of the column in regions representing strand. flipped for regions mapped to the reverse strand
+
+        return: tuple of (mapped regions, unmapped regions). unmapped regions include a "liftover_reason" column,\
+            which is either "deleted" (a region end is not in the new assembly) or "split" (the region ends are in different chains)
+    '''
+
+    chain_file = os.path.abspath(chain_file)
+    if not os.path.exists(chain_file):
+        raise Exception(f'Error: Chain file not found at {chain_file}')
+    chain_index = load_chain(chain_file, os.path.getmtime(chain_file))
+
+    chroms = regions[df_chr].astype(str).to_numpy()
+    starts = regions[df_start].to_numpy(dtype=np.int64)
+    ends = regions[df_end].to_numpy(dtype=np.int64)
+    lasts = np.maximum(ends - 1, starts) # last base of each region, points have start == end
+
+    new_chroms = np.empty(len(regions), dtype=object)
+    new_starts = np.zeros(len(regions), dtype=np.int64)
+    new_ends = np.zeros(len(regions), dtype=np.int64)
+    reversed_strand = np.zeros(len(regions), dtype=bool)
+    reason = np.full(len(regions), 'deleted', dtype=object)
+
+    # map all regions on a chromosome at once
+    for chrom in np.unique(chroms):
+        if chrom not in chain_index:
+            continue
+        blocks = chain_index[chrom]
+        rows = np.flatnonzero(chroms == chrom)
+
+        mapped = []
+        for pos in (starts[rows], lasts[rows]):
+            i = np.searchsorted(blocks['start'], pos, side='right') - 1
+            found = (i >= 0) & (pos < blocks['end'][np.maximum(i, 0)])
+            mapped.append((np.maximum(i, 0), found))
+        (i_first, found_first), (i_last, found_last) = mapped
+
+        same_chain = blocks['chain_id'][i_first] == blocks['chain_id'][i_last]
+        reason[rows[found_first & found_last & ~same_chain]] = 'split'
+        ok = found_first & found_last & same_chain
+        rows, i_first, i_last = rows[ok], i_first[ok], i_last[ok]
+
+        # position within the query assembly, converted to the forward strand where needed
+        q_first = blocks['q_start'][i_first] + (starts[rows] - blocks['start'][i_first])
+        q_last = blocks['q_start'][i_last] + (lasts[rows] - blocks['start'][i_last])
+        is_reverse = blocks['q_reverse'][i_first]
+        q_size = blocks['q_size'][i_first]
+        q_first = np.where(is_reverse, q_size - q_first - 1, q_first)
+        q_last = np.where(is_reverse, q_size - q_last - 1, q_last)
+
+        new_chroms[rows] = blocks['q_name'][i_first]
+        new_starts[rows] = np.minimum(q_first, q_last)
+        new_ends[rows] = np.where(ends[rows] > starts[rows], np.maximum(q_first, q_last) + 1, new_starts[rows])
+        reversed_strand[rows] = is_reverse
+        reason[rows] = None
+
+    is_mapped = pd.isna(reason)
+    unmapped = regions[~is_mapped]
+    unmapped['liftover_reason'] = reason[~is_mapped]
+
+    lifted = regions[is_mapped]
+    lifted[df_chr] = new_chroms[is_mapped]
+    lifted[df_start] = new_starts[is_mapped]
+    lifted[df_end] = new_ends[is_mapped]
+    if df_strand in lifted:
+        flip = reversed_strand[is_mapped]
+        lifted.loc[flip, df_strand] = lifted.loc[flip, df_strand].map({'+': '-', '-': '+'}).fillna(lifted.loc[flip, df_strand])
+
+    return lifted, unmapped
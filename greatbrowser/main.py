@@ -11,6 +11,7 @@ from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException, UnexpectedAlertPresentException, NoSuchElementException
 
 import os
+import time
 import pandas as pd
 pd.options.mode.chained_assignment = None
 
@@ -20,21 +21,27 @@ import numpy as np
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-from .functions import format_for_great, get_genes, get_genes_pivot, get_ucsc_browser, get_n_genes_region, get_table, adjust_global_controls, plot_table
+from .functions import get_driver_options, start_driver, format_for_great, get_genes, get_genes_pivot, get_ucsc_browser, get_ucsc_url, format_ucsc_track, get_n_genes_region, get_table, adjust_global_controls, plot_table, click_element, wait_for_page
+from .results import great_store_results, check_run_id
+from .plotting import great_render_table
+from .liftover import great_liftover
+from .background import GreatBackground, great_prepare_background
 
 def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray | str, get='genes', assembly='mm10', is_formatted=False, background_regions=False, 
               headless=True, df_chr='chr', df_start='start', df_end='end', df_index=None, df_score='score', 
               df_strand='strand', df_thickStart='thickStart', df_thickEnd='thickEnd', df_rgb='rgb', assoc_criteria='basal', cur_reg=True, 
-              plot = False, file_name = None, global_controls = dict):
+              plot = False, file_name = None, global_controls = dict, results_store = None, run_id = None, local_plot = False, 
+              ontology_edges = None, chain_file = None, lean = False):
     '''
     uses the given data sets to conduct automated analysis using GREAT browser
 
         param test_regions: the test data to be assessed. Used to determine which regions are selected
         param get: determines what information is generated by the function. for more information call great_get_options()
-        param assembly: the assembly of the inputted region set. Valid options include: hg38, hg19, mm10, mm9
-            For other assemblies consider the 'liftover' module. Not suggested for rs data
+        param assembly: the assembly used by GREAT. Valid options include: hg38, hg19, mm10, mm9
+            For other assemblies use chain_file to convert the inputted region sets to one of these. Not suggested for rs data
         param is_formatted: whether the inputted test and background regions are already in bed format (chr, start, end, name)
-        param background_regions: the background data to be assessed. Must be a superset including the test set
+        param background_regions: the background data to be assessed. Must be a superset including the test set\
+            when reusing a background across many calls, pass the output of great_prepare_background() so that it is only formatted and serialized once
         param headless: determines whether the browser is shown during operation or not. overridden for certain get options
         param df_chr: the name of the column in bed_data representing chromosome
         param df_start: the name of the column in bed_data representing start point
@@ -51,6 +58,17 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
         param plot: whether or not to plot tables for certain get options, detailed in great_get_options(). options include: "bar", "hierarchy"
         param file_name: what to name any pngs downloaded via get options, detailed in great_get_options(). do not include the extension
         param global_controls: dictionary controlling certain attributes of the data analysis. see great_global_controls() for more information
+        param results_store: directory of a parquet results store. if given, dataframe outputs are appended to it alongside run metadata.\
+            see great_query_results() for how to query the store
+        param run_id: the name under which the output is stored in results_store. a unique id is generated if none is given
+        param local_plot: whether to draw plots locally from the extracted table rather than through GREAT's visualization pages.\
+            see great_render_table() for more information
+        param ontology_edges: list of (parent, child) term pairs used when drawing hierarchy plots with local_plot
+        param chain_file: path to a UCSC chain file from the assembly of the inputted region sets to assembly, e.g. hg19ToHg38.over.chain.gz\
+            if given, the region sets are lifted over before submission, and unmapped regions are dropped. see great_liftover() for more information\
+            prepared backgrounds are not lifted over again
+        param lean: whether to block page resources which are not needed (fonts, stylesheets, trackers, and images other than GREAT's plots),\
+            and to stop waiting for pages once their structure has loaded. see great_browser_benchmark() to compare against the default settings
  
         return: varies depending on 'get' parameters. call great_get_options() for more information
     '''
@@ -60,25 +78,43 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
         # format genetic data if not already in bed format by column
         if not is_formatted:
             test_regions = format_for_great(test_regions, get, df_chr, df_start, df_end, df_index, df_score, df_strand, df_thickStart, df_thickEnd, df_rgb)
-            if not isinstance(background_regions, bool): 
-                background_regions = format_for_great(background_regions, get, df_chr, df_start, df_end, df_index, df_score, df_strand, df_thickStart, df_thickEnd, df_rgb)
         elif isinstance(test_regions, str): #load formatted file
             try: test_regions = pd.read_excel(test_regions)
             except: test_regions = pd.read_csv(test_regions, sep='\t')
-            if not isinstance(background_regions, bool):
-                try: background_regions = pd.read_excel(background_regions)
-                except: background_regions = pd.read_csv(background_regions, sep='\t')\
-        
-        # establish settings
-        options = Options()
-        options.add_argument('--ignore-ssl-errors=yes') # ignore insecure warning
-        options.add_argument('--ignore-certificate-errors')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-blink-features=AutomationControlled')
-        options.add_argument("--disable-extensions")
 
-        if headless:
-            options.add_argument('--headless') # makes it so that the browser doesn't open
+        # convert region sets to the selected assembly
+        if chain_file != None:
+            test_regions, unmapped = great_liftover(test_regions, chain_file, df_chr, df_start, df_end, df_strand)
+            if unmapped.shape[0] > 0:
+                print(f'{unmapped.shape[0]} test regions could not be lifted over to {assembly} and were removed. Use great_liftover() to inspect them')
+            test_regions = test_regions.reset_index(drop=True)
+
+        # custom tracks are made from the regions alone, so no browser is needed
+        if get.strip().lower() == 'ucsc_track':
+            return format_ucsc_track(test_regions, assembly, file_name if file_name != None else 'greatbrowser', df_chr, df_start, df_end, df_index)
+
+        # format, validate and serialize the background once, rather than for each chunk
+        if not isinstance(background_regions, bool) and not isinstance(background_regions, GreatBackground):
+            background_regions = great_prepare_background(background_regions, is_formatted, chain_file, df_chr, df_start, df_end, df_index, 
+                                                          df_score, df_strand, df_thickStart, df_thickEnd, df_rgb)
+
+        # keep a record of the submitted data for the results store, since the controls and regions are modified during analysis
+        if results_store != None:
+            if run_id != None: # check before running the job, so that its output isn't lost
+                check_run_id(results_store, get.strip().lower(), assembly, run_id)
+            submitted_regions = test_regions.copy()
+            submitted_controls = dict(global_controls) if isinstance(global_controls, dict) else {}
+
+        # check plot settings before running the job, so that its output isn't lost
+        if isinstance(plot, str):
+            if plot not in ['bar', 'hierarchy']:
+                raise Exception('Error: invalid plot type selected. Valid options include: "bar", "hierarchy"')
+            if plot == 'hierarchy' and local_plot and ontology_edges is None:
+                raise Exception('Error: ontology_edges must be given to plot a hierarchy with local_plot. Use (parent, child) pairs of term names or ontology ids')
+
+        # establish settings, GREAT's images are only needed by the pages plot_table opens
+        keep_great_images = isinstance(plot, str) and not local_plot
+        options = get_driver_options(headless, lean, keep_great_images)
 
         # split the dataset if too large, or raise an error
         gene_list = []
@@ -94,8 +130,7 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
             working_data = test_regions[(m)*200000:(m+1)*200000]
 
             # establish driver
-            driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()),
-                                    options=options)
+            driver = start_driver(options, lean)
             driver.get('https://great.stanford.edu/great/public/html/')
 
             cookies = driver.get_cookies()
@@ -107,13 +142,13 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
             # set assembly to desired choice
             try:
                 set_assembly = driver.find_element(By.ID, assembly)
-                set_assembly.click()
+                click_element(driver, set_assembly, lean)
             except NoSuchElementException:
                 raise Exception('Error: Invalid assembly. Please use the UCSC assembly nomenclature (blue text on the greatbrowser website)')
 
             # select 'BED data'
             use_input = driver.find_element(By.ID, 'fgChoiceData')
-            use_input.click()
+            click_element(driver, use_input, lean)
 
             # put BED data into text box
             working_string = working_data.to_csv(index=False, header=None, sep='\t')
@@ -125,17 +160,16 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
 
                 # select button to input
                 bg_input = driver.find_element(By.XPATH, '/html/body/div[2]/div[4]/div/form/fieldset/div[3]/div/ul/li[3]/label/input')
-                bg_input.click()
+                click_element(driver, bg_input, lean)
 
                 # put background data into text box
-                background_regions_string = background_regions.to_csv(index=False, header=None, sep='\t')
                 driver.execute_script('arguments[0].value = arguments[1];', 
                                         driver.find_element(By.XPATH, '/html/body/div[2]/div[4]/div/form/fieldset/div[3]/div/ul/li[3]/textarea'), 
-                                        background_regions_string)
+                                        background_regions.bed_string)
                 
             # show genomic region options
             show_criteria = driver.find_element(By.ID, 'assoc_btn')
-            show_criteria.click()
+            click_element(driver, show_criteria, lean)
 
             # select gene association criteria
             if assoc_criteria == 'basal':
@@ -144,10 +178,10 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
                 # select criteria
                 if assoc_criteria == 'two_closest':
                     select_criteria = driver.find_element(By.ID, 'twoClosestRule')
-                    select_criteria.click()
+                    click_element(driver, select_criteria, lean)
                 elif assoc_criteria == 'one_closest':
                     select_criteria = driver.find_element(By.ID, 'oneClosestRule')
-                    select_criteria.click()
+                    click_element(driver, select_criteria, lean)
                 else:
                     raise Exception('Invalid criteria given. Valid options include "basal", "two_nearest", and "one_nearest"')
 
@@ -156,11 +190,11 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
                 pass
             else:
                 cur_reg_dom = driver.find_element(By.ID, 'adv_includeCuratedRegDoms')
-                cur_reg_dom.click()
+                click_element(driver, cur_reg_dom, lean)
 
             # submit data
             submit = driver.find_element(By.ID, 'submit_button')
-            submit.click()
+            click_element(driver, submit, lean)
 
             # wait for the table
             try: newelem = WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.ID, 'job_description_container')))
@@ -169,12 +203,14 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
                 print(error_msg.text)
                 raise Exception('Error: Loading exceeded 20 seconds. Potential reasons: invalid input (generally or for assembly) or connection problems. Use headless=False to troubleshoot.')
             
+            if lean: wait_for_page(driver) # the results page's scripts are needed to expand and read the tables
+
             # expand the table
             driver.execute_script("document.getElementById('job_description_container').style.display = 'block';")
 
             # modify global controls
             if isinstance(global_controls, dict):
-                adjust_global_controls(driver, global_controls)
+                adjust_global_controls(driver, global_controls, lean)
 
             # get desired data
             output = False # default output
@@ -189,6 +225,7 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
                     else:
                         pass
                 case 'ucsc_browser': get_ucsc_browser(driver) 
+                case 'ucsc_url': output = get_ucsc_url(driver)
                 case 'genes_pivot': output = get_genes_pivot(driver)
                 case 'n_genes_region': get_n_genes_region(driver, 0, file_name, get)
                 case 'n_genes_tss': get_n_genes_region(driver, 1, file_name, get)
@@ -204,6 +241,9 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
 
             if n > 1: # if doing multiple iterations
                 pass 
+            elif isinstance(output, str): # if the output is a url, quit the driver and return it
+                driver.quit()
+                return output
             elif not isinstance(output, pd.DataFrame): # if an output does not exist, quit the driver and return
                 driver.quit()
                 return
@@ -211,17 +251,77 @@ def great_analysis(test_regions: pd.DataFrame | pl.DataFrame | list | np.ndarray
                 pass
             elif not isinstance(plot, str): # if a table is defined, and visualization is not active, quit the driver and return the output
                 pass
+            elif local_plot:
+                great_render_table(output, plot, file_name if file_name != None else f'{get}_{plot}_plot', ontology_edges=ontology_edges)
             else:
                 plot_table(driver, plot, n_table, get, file_name)
 
             m+=1
 
         driver.quit()
+
+        if results_store != None:
+            great_store_results(output, results_store, get.strip().lower(), assembly, submitted_controls, submitted_regions, run_id)
+
         return output
 
     except UnexpectedAlertPresentException:
         raise Exception('Error: Too many requests sent in quick succession. Please delay submitting requests to GREAT')
 
+def get_worker_memory(driver):
+    '''
+    gets the memory used by a browser worker, summed over chromedriver and every chrome process it started
+
+        param driver: the driver to measure
+
+        return: resident memory in bytes
+    '''
+
+    import psutil # only needed for benchmarking
+    driver_process = psutil.Process(driver.service.process.pid)
+    memory = 0
+    for process in [driver_process] + driver_process.children(recursive=True):
+        try: memory += process.memory_info().rss
+        except psutil.NoSuchProcess: pass # e.g. a renderer which has already exited
+
+    return memory
+
+def great_browser_benchmark(n_loads=3, headless=True):
+    '''
+    measures how long GREAT's submission page takes to load, and how much memory each browser worker uses,\
+    with the default and lean browser settings. requires psutil
+
+        param n_loads: the number of times the page is loaded with each setting
+        param headless: determines whether the browser is shown during operation or not
+
+        return: dataframe of the mean load time (s), number of resources loaded, and resident memory (MB) of the\
+            chrome process tree for each setting
+    '''
+
+    try: import psutil
+    except ImportError: raise Exception('Error: great_browser_benchmark requires psutil. Install it using "pip install psutil"')
+
+    measurements = []
+    for lean in [False, True]:
+        driver = start_driver(get_driver_options(headless, lean), lean)
+        for n in range(n_loads):
+            driver.delete_all_cookies()
+            driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+
+            start_time = time.perf_counter()
+            driver.get('https://great.stanford.edu/great/public/html/')
+            WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.ID, 'submit_button')))
+            load_seconds = time.perf_counter() - start_time
+
+            measurements.append({
+                'mode': 'lean' if lean else 'default',
+                'load_seconds': load_seconds,
+                'n_resources': driver.execute_script("return performance.getEntriesByType('resource').length;"),
+                'memory_mb': get_worker_memory(driver) / 1e6})
+        driver.quit()
+
+    return pd.DataFrame(measurements).groupby('mode', sort=False).mean()
+
 def great_get_options():
     '''
     gives information regarding potential "get" parameter options.
@@ -232,12 +332,15 @@ def great_get_options():
     print('"get" Parameter Options:\n')
     print('get = genes \t returns a dataframe of the inputted data + genes associated with each probe. For large datasets, run multiple iterations and merge dataframes post-hoc using pd.concat')
     print('get = ucsc_browser \t opens ucsc genome browser for the inputted data')
+    print('get = ucsc_url \t returns the url of the ucsc genome browser session for the inputted data, without opening it')
+    print('get = ucsc_track \t returns the inputted data as a ucsc custom track string, named by file_name, without opening a browser')
     print('get = genes_pivot \t same as genes, but grouped by gene rather than region')
     print('get = n_genes_region \t saves a barplot showing the number of region with x gene associations, grouped by x, as a png')
     print('get = n_genes_tss \t saves a batplot showing the distance between each probe/gene pair, grouped by kilobases, as a png')
     print('get = n_genes_abs_tss \t same as n_genes_tss but with absolute value being used for distance')
 
-    print('\nThe below options all additionally save a png if plot=bar (barplot) or plot=hierarchy (hierarchy plot) (default=False)\n')
+    print('\nThe below options all additionally save a png if plot=bar (barplot) or plot=hierarchy (hierarchy plot) (default=False)')
+    print('Use local_plot=True to draw these from the returned table instead of through GREAT (hierarchy plots require ontology_edges)\n')
 
     print('get = ensembl_genes \t returns a dataframe of the Ensembl genes processes associated with the probe set')
     print('get = go_process \t returns a dataframe of the GO biological processes associated with the probe set')
@@ -0,0 +1,172 @@
+from matplotlib.figure import Figure
+from matplotlib import colormaps
+
+from concurrent.futures import ProcessPoolExecutor
+
+import os
+import pandas as pd
+pd.options.mode.chained_assignment = None
+
+import numpy as np
+
+def get_values(table: pd.DataFrame, value):
+    '''
+    gets a column of a table generated by get_table as -log10 values, which is how GREAT displays p-values and q-values
+
+        param table: the table generated by get_table
+        param value: the column to convert
+
+        return: series of -log10 values, or the raw values if the column is not a p-value or q-value
+    '''
+
+    if value not in table:
+        raise Exception(f'KeyError: "{value}" not found in columns')
+
+    values = pd.to_numeric(table[value].astype(str).str.replace(',', '').str.rstrip('%'), errors='coerce')
+    if 'pval' in value or 'qval' in value:
+        values = -np.log10(values.clip(lower=np.finfo(float).tiny))
+
+    return values
+
+def render_bar(table: pd.DataFrame, value):
+    '''
+    draws a bar chart of the table sorted by the given value, equivalent to GREAT's "Bar chart of current sorted value"
+
+        param table: the terms to show, with their plotted values in the "value" column, as selected by great_render_table
+        param value: the column the values were taken from
+
+        return: matplotlib figure
+    '''
+
+    fig = Figure(figsize=(10, 1 + 0.3*table.shape[0]))
+    ax = fig.add_subplot()
+
+    ax.barh(range(table.shape[0]), table['value'], color='#2a6ebb')
+    ax.set_yticks(range(table.shape[0]), table['term_name'], fontsize=8)
+    ax.invert_yaxis() # most significant term at the top
+    ax.set_xlabel(f'-log10({value})' if ('pval' in value or 'qval' in value) else value)
+
+    fig.tight_layout()
+    return fig
+
+def render_hierarchy(table: pd.DataFrame, ontology_edges):
+    '''
+    draws the shown terms within the ontology hierarchy, equivalent to GREAT's "Visualize shown terms in hierarchy".\
+    ancestors which are not among the shown terms are included in grey so that the hierarchy is connected
+
+        param table: the terms to show, with the values used to color them in the "value" column, as selected by great_render_table
+        param ontology_edges: list of (parent, child) pairs, using either term names or ontology ids (e.g. GO:0008150)
+
+        return: matplotlib figure
+    '''
+
+    if ontology_edges is None:
+        raise Exception('Error: ontology_edges must be given to plot a hierarchy. Use (parent, child) pairs of term names or ontology ids')
+
+    # edges may be given by id or by name, label everything by name
+    id_to_name = dict(zip(table['go_annotation'], table['term_name']))
+    parents = {}
+    for parent, child in ontology_edges:
+        parents.setdefault(id_to_name.get(child, child), []).append(id_to_name.get(parent, parent))
+
+    # include the ancestors of every shown term
+    shown = dict(zip(table['term_name'], table['value']))
+    nodes = set()
+    to_visit = list(shown)
+    while to_visit:
+        node = to_visit.pop()
+        if node not in nodes:
+            nodes.add(node)
+            to_visit.extend(parents.get(node, []))
+
+    # place each term one level below its deepest parent
+    depth = {}
+    def get_depth(node, path=()):
+        if node not in depth:
+            if node in path: raise Exception(f'Error: ontology_edges contains a cycle at "{node}"')
+            depth[node] = 1 + max([get_depth(p, path + (node,)) for p in parents.get(node, [])], default=-1)
+        return depth[node]
+    for node in nodes: get_depth(node)
+
+    levels = {}
+    for node in sorted(nodes): levels.setdefault(depth[node], []).append(node)
+    width = max(len(x) for x in levels.values())
+    position = {}
+    for level, level_nodes in levels.items():
+        for i, node in enumerate(level_nodes):
+            position[node] = ((i + 1) * width / (len(level_nodes) + 1), -level)
+
+    fig = Figure(figsize=(max(6, 2*width), max(4, 1.5*len(levels))))
+    ax = fig.add_subplot()
+
+    for child in nodes:
+        for parent in parents.get(child, []):
+            ax.plot([position[parent][0], position[child][0]], [position[parent][1], position[child][1]], color='grey', lw=0.8, zorder=1)
+
+    # color the shown terms by value
+    cmap = colormaps['Reds']
+    v_max = max(shown.values()) if shown else 1
+    for node in nodes:
+        color = cmap(0.3 + 0.7*shown[node]/v_max) if node in shown and v_max > 0 else 'lightgrey'
+        ax.scatter(*position[node], s=200, color=color, edgecolors='black', zorder=2)
+        ax.annotate(node, position[node], xytext=(0, -14), textcoords='offset points', ha='center', va='top', fontsize=7)
+
+    ax.set_axis_off()
+    fig.tight_layout()
+    return fig
+
+def great_render_table(table: pd.DataFrame, plot_type='bar', file_name='table', value='binom_raw_pval', n_terms=20, ontology_edges=None):
+    '''
+    plots a table generated by great_analysis locally, without a browser, and outputs this as a png
+
+        param table: the table generated by great_analysis with a table get option, see great_get_options()
+        param plot_type: the type of plot to generate. options: "bar", "hierarchy"
+        param file_name: the name of the outputted image file, excluding extension
+        param value: the column to sort, select and plot terms by. p-values and q-values are plotted as -log10
+        param n_terms: the maximum number of terms to show
+        param ontology_edges: list of (parent, child) pairs, using either term names or ontology ids. required for "hierarchy"
+
+        return: none
+    '''
+
+    if plot_type not in ['bar', 'hierarchy']:
+        raise Exception('Error: invalid type selected. Valid options include: "bar", "hierarchy"')
+
+    # select the terms to show
+    if isinstance(table, pd.DataFrame):
+        table = table.copy()
+        table['value'] = get_values(table, value)
+        table = table.dropna(subset=['value']).sort_values('value', ascending=False).head(n_terms)
+    if not isinstance(table, pd.DataFrame) or table.shape[0] == 0:
+        print('No results to plot.')
+        return
+
+    match plot_type:
+        case 'bar': fig = render_bar(table, value)
+        case 'hierarchy': fig = render_hierarchy(table, ontology_edges)
+
+    fig.savefig(f'{file_name}.png', dpi=150, facecolor='white')
+    print(f'Image saved as {file_name}.png in {os.getcwd()}')
+
+    return
+
+def great_render_tables(tables: dict, plot_type='bar', value='binom_raw_pval', n_terms=20, ontology_edges=None, n_workers=None):
+    '''
+    plots many tables generated by great_analysis in parallel, without a browser
+
+        param tables: dictionary of tables to plot. keys are used as the file names, excluding extension
+        param plot_type: the type of plot to generate. options: "bar", "hierarchy"
+        param value: the column to sort, select and plot terms by. p-values and q-values are plotted as -log10
+        param n_terms: the maximum number of terms to show
+        param ontology_edges: list of (parent, child) pairs, using either term names or ontology ids. required for "hierarchy"
+        param n_workers: the number of processes used. defaults to the number of cpus
+
+        return: none
+    '''
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        jobs = [executor.submit(great_render_table, table, plot_type, file_name, value, n_terms, ontology_edges)
+                for file_name, table in tables.items()]
+        for job in jobs: job.result() # raise any errors
+
+    return
@@ -0,0 +1,240 @@
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.compute as pc
+
+import os
+import json
+import uuid
+import hashlib
+import datetime
+
+import pandas as pd
+pd.options.mode.chained_assignment = None
+
+from .functions import table_columns
+
+# tables produced by get_table, as named by the get parameter
+table_options = ['ensembl_genes', 'go_process', 'go_component', 'go_function',
+                 'human_phenotype', 'mouse_phenotype_ko', 'mouse_phenotype']
+
+# get_table columns which hold text rather than numbers
+text_columns = ['term_name', 'go_annotation']
+
+# run ids are kept as strings, even when they look like numbers
+partition_fields = [('assembly', pa.string()), ('run_id', pa.string())]
+partitioning = ds.partitioning(pa.schema(partition_fields), flavor='hive')
+
+# run metadata written alongside every table
+metadata_fields = [('input_hash', pa.string()), ('global_controls', pa.string()), ('created', pa.string())]
+
+# every run of a table get option is written with this schema, so that runs can be read together
+table_schema = pa.schema([(col, pa.string() if col in text_columns else pa.float64()) for col in table_columns]
+                         + metadata_fields + partition_fields)
+
+def get_schema(get, output: pd.DataFrame):
+    '''
+    gets the schema used to store the output of a get option
+
+        param get: the get option used to generate the output
+        param output: the output to be stored
+
+        return: pyarrow schema. gene outputs depend on the inputted columns, so integer, float and boolean columns keep\
+            their types, associated genes are stored as a list of genes, and all other columns are stored as text
+    '''
+
+    if get in table_options:
+        return table_schema
+
+    fields = []
+    for col in output.columns:
+        if col == 'associated_genes': fields.append((col, pa.list_(pa.string())))
+        elif pd.api.types.is_bool_dtype(output[col]): fields.append((col, pa.bool_()))
+        elif pd.api.types.is_integer_dtype(output[col]): fields.append((col, pa.int64()))
+        elif pd.api.types.is_float_dtype(output[col]): fields.append((col, pa.float64()))
+        else: fields.append((col, pa.string()))
+
+    return pa.schema(fields + metadata_fields + partition_fields)
+
+def split_genes(genes):
+    '''
+    splits the genes associated with a region, as scraped by get_genes, into a list
+
+        param genes: the associated genes, e.g. "Pax6 (+1234), Elp4 (-5678)", or a list of genes
+
+        return: list of genes, each with its distance to the region
+    '''
+
+    if isinstance(genes, list):
+        return [str(x) for x in genes]
+    if genes is None or genes != genes: # missing
+        return None
+    return [x.strip() for x in str(genes).split(',') if x.strip() != '']
+
+def get_store_schema(store_path, get):
+    '''
+    gets the schema used to read a dataset in the store. gene outputs may have different columns in each run,\
+    so their schemas are combined, with integer columns promoted to float where runs disagree
+
+        param store_path: the directory containing the store
+        param get: which dataset to read
+
+        return: pyarrow schema
+    '''
+
+    if get in table_options:
+        return table_schema
+
+    dataset = ds.dataset(os.path.join(store_path, get), format='parquet', partitioning=partitioning)
+    schemas = [fragment.physical_schema for fragment in dataset.get_fragments()] + [pa.schema(partition_fields)]
+    try: return pa.unify_schemas(schemas, promote_options='permissive')
+    except pa.ArrowInvalid as e: raise Exception(f'Error: Runs stored for get = {get} have incompatible columns. {e}')
+
+def check_run_id(store_path, get, assembly, run_id):
+    '''
+    checks that a run id has not already been used, since runs are append only
+
+        param store_path: the directory containing the store
+        param get: the get option used to generate the output
+        param assembly: the assembly used to generate the output
+        param run_id: the name of the run
+
+        return: none
+    '''
+
+    run_dir = os.path.join(store_path, get, f'assembly={assembly}', f'run_id={run_id}')
+    if os.path.exists(run_dir):
+        raise Exception(f'Error: Run "{run_id}" already exists in the store for get = {get}. Use a different run_id')
+
+    return
+
+def hash_regions(regions: pd.DataFrame):
+    '''
+    creates a stable hash of a region set, used to identify which input produced a stored result
+
+        param regions: the bed formatted regions submitted to GREAT
+
+        return: hex digest of the region set
+    '''
+
+    row_hashes = pd.util.hash_pandas_object(regions.astype(str), index=False).values
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()
+
+def great_store_results(output: pd.DataFrame, store_path, get, assembly, global_controls=None, test_regions=None, run_id=None):
+    '''
+    appends a table generated by great_analysis to a partitioned parquet store. each get option is kept as its own dataset,\
+    partitioned by assembly and run so that queries only read the files they need
+
+        param output: the dataframe returned by great_analysis
+        param store_path: the directory containing the store. created if it does not exist
+        param get: the get option used to generate output. determines which dataset the table is written to
+        param assembly: the assembly used to generate output
+        param global_controls: the global controls used to generate output, recorded as run metadata
+        param test_regions: the bed formatted regions used to generate output, recorded as a hash
+        param run_id: the name of the run. a unique id is generated if none is given
+
+        return: the run id
+    '''
+
+    if not isinstance(output, pd.DataFrame):
+        raise Exception('Error: Only dataframe outputs can be stored. See great_get_options() for which get options return a dataframe')
+
+    if run_id == None:
+        run_id = uuid.uuid4().hex
+    run_id = str(run_id)
+
+    check_run_id(store_path, get, assembly, run_id)
+
+    table = output.copy()
+    schema = get_schema(get, table)
+
+    # enrichment statistics are scraped as text, store them as numbers so they can be filtered
+    if get in table_options:
+        for col in table.columns:
+            if col not in text_columns:
+                table[col] = pd.to_numeric(table[col].astype(str).str.replace(',', '').str.rstrip('%'), errors='coerce').astype(float)
+    else:
+        for col, field in zip(table.columns, schema):
+            if col == 'associated_genes':
+                table[col] = table[col].apply(split_genes)
+            elif field.type == pa.string():
+                table[col] = table[col].where(table[col].isna(), table[col].astype(str))
+
+    # run metadata
+    if not isinstance(global_controls, dict):
+        global_controls = {}
+    table['input_hash'] = hash_regions(test_regions) if isinstance(test_regions, pd.DataFrame) else None
+    table['global_controls'] = json.dumps(global_controls, sort_keys=True, default=str)
+    table['created'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    table['assembly'] = assembly
+    table['run_id'] = run_id
+
+    ds.write_dataset(pa.Table.from_pandas(table, schema=schema, preserve_index=False), os.path.join(store_path, get), format='parquet',
+                     partitioning=partitioning,
+                     basename_template=f'{run_id}-{{i}}.parquet', existing_data_behavior='overwrite_or_ignore')
+
+    return run_id
+
+def great_query_results(store_path, get='go_process', columns=None, terms=None, run_ids=None, assembly=None,
+                  pval_col='binom_fdr_qval', max_pval=None, min_runs=None, genes=None, filter=None):
+    '''
+    queries a store written by great_store_results or great_analysis. filters are pushed down to the parquet files,\
+    so only the matching partitions and row groups are read
+
+        param store_path: the directory containing the store
+        param get: which dataset to query, named by the get option that generated it
+        param columns: which columns to return. all columns are returned by default
+        param terms: only return rows for these term names
+        param run_ids: only return rows from these runs
+        param assembly: only return rows from this assembly
+        param pval_col: the column used for max_pval. options include any p-value or q-value column produced by get_table
+        param max_pval: only return rows with pval_col below this value
+        param min_runs: if given, aggregate by term, returning terms which pass the filters in at least this many runs
+        param genes: for get = genes, only return regions associated with at least one of these genes, given by name e.g. "Pax6"
+        param filter: any other pyarrow dataset expression to filter by, e.g. pyarrow.dataset.field('start') >= 1000000
+
+        return: dataframe of matching rows, or of matching terms alongside the number of runs and best p-value if min_runs is given
+    '''
+
+    dataset_path = os.path.join(store_path, get)
+    if not os.path.isdir(dataset_path):
+        raise Exception(f'Error: No results stored for get = {get} in {store_path}')
+
+    dataset = ds.dataset(dataset_path, schema=get_store_schema(store_path, get), format='parquet', partitioning=partitioning)
+
+    # build filter
+    expression = None
+    def add_filter(expression, new):
+        return new if expression is None else expression & new
+
+    if assembly != None:
+        expression = add_filter(expression, ds.field('assembly') == assembly)
+    if run_ids != None:
+        expression = add_filter(expression, ds.field('run_id').isin([str(x) for x in run_ids]))
+    if terms != None:
+        expression = add_filter(expression, ds.field('term_name').isin(list(terms)))
+    if max_pval != None:
+        expression = add_filter(expression, ds.field(pval_col) < max_pval)
+    if filter is not None:
+        expression = add_filter(expression, filter)
+
+    if genes != None:
+        table = dataset.to_table(filter=expression)
+
+        # match gene names, ignoring the distance to the region
+        gene_lists = table['associated_genes'].combine_chunks()
+        names = pc.replace_substring_regex(pc.list_flatten(gene_lists), pattern=r'\s*\(.*\)$', replacement='')
+        rows = pc.unique(pc.filter(pc.list_parent_indices(gene_lists), pc.is_in(names, value_set=pa.array([str(x) for x in genes]))))
+        table = table.take(rows)
+
+        return (table.select(columns) if columns != None else table).to_pandas()
+
+    if min_runs == None:
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+    # count the number of runs each term passes in
+    table = dataset.to_table(columns=['term_name', 'run_id', pval_col], filter=expression)
+    counts = table.group_by('term_name').aggregate([('run_id', 'count_distinct'), (pval_col, 'min')])
+    counts = counts.rename_columns({'run_id_count_distinct': 'n_runs', f'{pval_col}_min': f'min_{pval_col}'})
+    counts = counts.filter(pc.field('n_runs') >= min_runs)
+
+    return counts.to_pandas().sort_values('n_runs', ascending=False, ignore_index=True)
@@ -27,6 +27,8 @@ setup(
         'Pillow',
         'urllib3',
         'lxml',
+        'pyarrow>=17',
+        'matplotlib',
     ],
     keywords=['python', 'genomics', 'genetics', 'greatbrowser', 'great', 'automated', 'analysis'],
     classifiers=[
@@ -0,0 +1,23 @@
+import pickle
+import pytest
+import pandas as pd
+
+from greatbrowser import great_prepare_background
+
+def test_formatted_without_names():
+    # formatted regions are read by position, whatever the column names
+    background = great_prepare_background(pd.DataFrame([['chr1', 1, 100, 'a'], ['chr2', 5, 50, 'b']]), is_formatted=True)
+
+    assert background.n_regions == 2
+    assert background.bed_string == 'chr1\t1\t100\ta\nchr2\t5\t50\tb\n'
+
+@pytest.mark.parametrize('start, end', [(-1, 10), (10, 5), ('x', 10)])
+def test_invalid_regions(start, end):
+    with pytest.raises(Exception, match='Background'):
+        great_prepare_background(pd.DataFrame([['chr1', start, end, 'a']]), is_formatted=True)
+
+def test_pickle():
+    background = great_prepare_background(pd.DataFrame({'chr': ['chr1', 'chr1'], 'start': [1, 200], 'end': [100, 300]}))
+    loaded = pickle.loads(pickle.dumps(background))
+
+    assert (loaded.bed_string, loaded.n_regions, loaded.prepare_seconds) == (background.bed_string, background.n_regions, background.prepare_seconds)
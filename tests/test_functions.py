@@ -0,0 +1,26 @@
+import pytest
+import pandas as pd
+
+from greatbrowser.functions import is_ucsc_url, format_ucsc_track
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://genome.ucsc.edu/cgi-bin/hgTracks?db=mm10&hgt.customText=x', True),
+    ('https://genome-euro.ucsc.edu/cgi-bin/hgTracks?db=hg38', True),
+    ('https://great.stanford.edu/great/public/cgi-bin/showUCSC.php?id=1', False), # relative GREAT link, as resolved by href
+    ('https://genome.ucsc.edu/cgi-bin/hgGateway?db=mm10', False),
+    ('https://notucsc.edu/cgi-bin/hgTracks', False),
+    (None, False)])
+def test_is_ucsc_url(url, expected):
+    assert is_ucsc_url(url) == expected
+
+def test_format_ucsc_track():
+    regions = pd.DataFrame({'chr': ['chr2', 'chr1'], 'start': [10, 20], 'end': [10, 30], 'name': ['a', 'b']})
+    lines = format_ucsc_track(regions, 'mm10', 'set1', 'chr', 'start', 'end', 'name').splitlines()
+
+    assert lines[0] == 'browser position chr2:11-11' # 1-based, covering at least one base
+    assert lines[1] == 'track name="set1" description="set1" db=mm10 visibility=pack'
+    assert lines[2:] == ['chr2\t10\t10\ta', 'chr1\t20\t30\tb']
+
+def test_format_ucsc_track_empty():
+    with pytest.raises(Exception, match='No regions'):
+        format_ucsc_track(pd.DataFrame({'chr': [], 'start': [], 'end': []}), 'mm10', 'set1', 'chr', 'start', 'end', None)
@@ -0,0 +1,31 @@
+import pytest
+import pandas as pd
+
+from greatbrowser import great_liftover
+
+# a higher scoring forward chain, overlapping a lower scoring reverse chain which fills its gaps
+chain = '''chain 1000 chr1 1000 + 100 350 chr1 2000 + 500 800 1
+100	50	50
+100
+
+chain 500 chr1 1000 + 150 600 chr2 1000 - 0 450 2
+50	0	0
+400
+'''
+
+def test_overlapping_chains(tmp_path):
+    chain_file = tmp_path / 'test.over.chain'
+    chain_file.write_text(chain)
+    regions = pd.DataFrame({'chr': ['chr1', 'chr1', 'chr1', 'chr9', 'chr1'], 'start': [150, 450, 500, 5, 210],
+                            'end': [160, 460, 500, 6, 260], 'name': ['a', 'b', 'c', 'd', 'e'], 'strand': ['+', '-', '+', '+', '+']})
+
+    lifted, unmapped = great_liftover(regions, str(chain_file))
+
+    assert lifted.values.tolist() == [['chr1', 550, 560, 'a', '+'], ['chr2', 690, 700, 'b', '+'], ['chr2', 649, 649, 'c', '-']]
+    assert unmapped['liftover_reason'].tolist() == ['deleted', 'split']
+
+def test_no_chains(tmp_path):
+    chain_file = tmp_path / 'empty.over.chain'
+    chain_file.write_text('# not a chain file\n')
+    with pytest.raises(Exception, match='No chains found'):
+        great_liftover(pd.DataFrame({'chr': ['chr1'], 'start': [1], 'end': [2]}), str(chain_file))
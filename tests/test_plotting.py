@@ -0,0 +1,13 @@
+import pandas as pd
+
+from greatbrowser import great_render_table
+
+def test_no_terms(tmp_path, monkeypatch, capsys):
+    # p-values which could not be scraped leave no terms to plot
+    monkeypatch.chdir(tmp_path)
+    table = pd.DataFrame({'term_name': ['a'], 'go_annotation': ['GO:1'], 'binom_raw_pval': ['None']})
+
+    for plot_type in ['bar', 'hierarchy']:
+        great_render_table(table, plot_type, plot_type)
+        assert 'No results to plot.' in capsys.readouterr().out
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,47 @@
+import pytest
+import pandas as pd
+import pyarrow.dataset as ds
+
+from greatbrowser import great_store_results, great_query_results
+from greatbrowser.functions import table_columns
+
+def make_table(terms, value):
+    '''
+    creates a table in the form returned by get_table, where every statistic is the given text value
+    '''
+
+    return pd.DataFrame([[term, f'GO:{n}'] + [value]*(len(table_columns)-2) for n, term in enumerate(terms)], columns=table_columns)
+
+def test_mixed_runs(tmp_path):
+    # integer-like and decimal statistics, and a run without input regions, must be readable together
+    great_store_results(make_table(['a', 'b'], '2'), tmp_path, 'go_process', 'mm10', run_id='a')
+    great_store_results(make_table(['a'], '2.5'), tmp_path, 'go_process', 'mm10', test_regions=pd.DataFrame({'chr': ['chr1']}), run_id='b')
+
+    results = great_query_results(tmp_path)
+    assert results.shape[0] == 3
+    assert sorted(results['binom_fold_enrichment']) == [2.0, 2.0, 2.5]
+    assert results['input_hash'].isna().sum() == 2
+
+    counts = great_query_results(tmp_path, max_pval=3, min_runs=2)
+    assert counts['term_name'].tolist() == ['a']
+
+def test_existing_run(tmp_path):
+    great_store_results(make_table(['a'], '0.01'), tmp_path, 'go_process', 'mm10', run_id=1)
+    with pytest.raises(Exception, match='already exists'):
+        great_store_results(make_table(['a'], '0.01'), tmp_path, 'go_process', 'mm10', run_id=1)
+
+def test_gene_runs(tmp_path):
+    # gene outputs keep the inputted columns, so runs may differ in columns and number types
+    great_store_results(pd.DataFrame({'chr': ['chr1', 'chr2'], 'start': [100, 5000], 'end': [200, 6000],
+                                      'associated_genes': ['Pax6 (+120), Elp4 (-3400)', 'Sox2 (+10)']}), tmp_path, 'genes', 'mm10', run_id='a')
+    great_store_results(pd.DataFrame({'chr': ['chr3'], 'start': [50], 'end': [60], 'score': [0.5],
+                                      'associated_genes': ['Pax6 (-90)']}), tmp_path, 'genes', 'mm10', run_id='b')
+
+    results = great_query_results(tmp_path, get='genes', genes=['Pax6'])
+    assert sorted(results['chr']) == ['chr1', 'chr3']
+    assert list(results.loc[results['chr'] == 'chr1', 'associated_genes'].iloc[0]) == ['Pax6 (+120)', 'Elp4 (-3400)']
+    assert results['start'].dtype == 'int64'
+    assert results['score'].isna().sum() == 1
+
+    results = great_query_results(tmp_path, get='genes', columns=['chr'], filter=ds.field('start') >= 1000)
+    assert results['chr'].tolist() == ['chr2']